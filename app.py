@@ -1,12 +1,36 @@
 import os
+import html
+import hmac
+import hashlib
 import logging
+import threading
+from datetime import datetime, timezone
 from functools import wraps
-from flask import Flask, request, jsonify, send_from_directory, Response
-from config import HOST, PORT, AUDIO_DIR, BASE_URL, ADMIN_PASSWORD
-from models import init_db, Channel, Episode
-from downloader import extract_channel_id, fetch_channel_videos, get_video_metadata, download_audio
+from flask import Flask, request, jsonify, send_from_directory, Response, g
+from flask_caching import Cache
+from flask_compress import Compress
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+from werkzeug.security import safe_join
+from config import (HOST, PORT, AUDIO_DIR_STR, STATIC_DIR, BASE_URL, ADMIN_PASSWORD,
+                    AUDIO_ACCEL_REDIRECT, AUDIO_SENDFILE, CACHE_TYPE, CACHE_REDIS_URL,
+                    CHECK_INTERVAL_HOURS)
+from models import init_db, reset_refresh_status, Channel, Episode
+from downloader import (extract_channel_id, fetch_channel_videos, get_video_metadata, download_audio,
+                        get_metadata_cache_stats, clear_metadata_cache)
 from feed_generator import generate_feed
-from scheduler import create_scheduler, refresh_channel, refresh_all_channels
+from scheduler import (create_scheduler, refresh_channel, is_refresh_running,
+                       acquire_scheduler_lock, schedule_channel_refreshes,
+                       PERIODIC_JOB_PREFIX, QUEUED_JOB_PREFIX)
+
+
+# Pre-serialized bodies for the most common JSON replies
+_SUCCESS = b'{"success":true}'
+_CHANNEL_NOT_FOUND = b'{"error":"Channel not found"}'
+
+
+def json_response(body: bytes, status: int = 200) -> Response:
+    """Wrap an already serialized JSON body in a fresh response."""
+    return Response(body, status=status, mimetype='application/json')
 
 
 def check_auth(channel):
@@ -35,7 +59,7 @@ def require_auth(f):
     def decorated(channel_id, *args, **kwargs):
         channel = Channel.get_by_id(channel_id)
         if not channel:
-            return jsonify({'error': 'Channel not found'}), 404
+            return json_response(_CHANNEL_NOT_FOUND, 404)
 
         if not check_auth(channel):
             if channel.get('auth_type') == 'token':
@@ -59,7 +83,7 @@ def require_admin_auth(f):
             return f(*args, **kwargs)
 
         auth = request.authorization
-        if not auth or auth.password != ADMIN_PASSWORD:
+        if not auth or not hmac.compare_digest((auth.password or '').encode(), ADMIN_PASSWORD.encode()):
             return Response(
                 'Admin authentication required',
                 401,
@@ -76,246 +100,235 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+# No static route: static/index.html is only served by index(), behind the admin password
+app = Flask(__name__, static_folder=None)
+app.config['CACHE_TYPE'] = CACHE_TYPE
+app.config['CACHE_DEFAULT_TIMEOUT'] = 300
+if CACHE_REDIS_URL:
+    app.config['CACHE_REDIS_URL'] = CACHE_REDIS_URL
+cache = Cache(app)
+
+# Per-channel locks so each stale feed is rendered once, without blocking other channels
+_feed_render_locks: dict[int, threading.Lock] = {}
+_feed_render_locks_guard = threading.Lock()
+
+
+class CompressCache:
+    """flask-compress backend storing compressed bodies for responses that set g.compress_key."""
+
+    def get(self, key):
+        if key.endswith(';'):
+            return None
+        return cache.get(f'compress:{key}')
+
+    def set(self, key, value):
+        if not key.endswith(';'):
+            cache.set(f'compress:{key}', value)
+
+
+app.config['COMPRESS_MIMETYPES'] = ['application/rss+xml', 'application/xml', 'text/html', 'application/json']
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_CACHE_BACKEND'] = CompressCache
+app.config['COMPRESS_CACHE_KEY'] = lambda req: g.get('compress_key', '')
+Compress(app)
 
 # Initialize database
 init_db()
 
-# HTML template for the web UI
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>YouTube Podcast Generator</title>
-    <style>
-        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-               max-width: 800px; margin: 50px auto; padding: 20px; background: #f5f5f5; }
-        h1 { color: #333; }
-        .card { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
-        input[type="text"], input[type="password"], select {
-            padding: 8px; font-size: 14px; border: 1px solid #ddd; border-radius: 4px; margin: 2px; }
-        input.url-input { width: 70%; }
-        button { padding: 10px 20px; font-size: 16px; background: #ff0000; color: white; border: none;
-                 border-radius: 4px; cursor: pointer; margin-left: 10px; }
-        button:hover { background: #cc0000; }
-        button.secondary { background: #666; }
-        button.secondary:hover { background: #444; }
-        button.danger { background: #dc3545; }
-        button.danger:hover { background: #c82333; }
-        button.small { padding: 5px 10px; font-size: 12px; margin-left: 5px; }
-        .channel { padding: 15px; border-bottom: 1px solid #eee; }
-        .channel:last-child { border-bottom: none; }
-        .channel-header { display: flex; justify-content: space-between; align-items: center; }
-        .channel-name { font-weight: bold; font-size: 18px; }
-        .channel-actions { display: flex; gap: 10px; }
-        .feed-url { font-size: 12px; color: #666; word-break: break-all; margin: 8px 0; }
-        .feed-url a { color: #0066cc; }
-        .feed-url code { background: #f0f0f0; padding: 2px 6px; border-radius: 3px; }
-        .auth-section { margin-top: 10px; padding: 10px; background: #f9f9f9; border-radius: 4px; font-size: 13px; }
-        .auth-badge { display: inline-block; padding: 2px 8px; border-radius: 3px; font-size: 11px; margin-left: 10px; }
-        .auth-badge.none { background: #e9ecef; color: #495057; }
-        .auth-badge.basic { background: #cce5ff; color: #004085; }
-        .auth-badge.token { background: #d4edda; color: #155724; }
-        .auth-form { margin-top: 8px; }
-        .auth-form input { margin-right: 5px; }
-        .loading { display: none; color: #666; font-style: italic; }
-        .message { padding: 10px; margin: 10px 0; border-radius: 4px; }
-        .message.success { background: #d4edda; color: #155724; }
-        .message.error { background: #f8d7da; color: #721c24; }
-        .hidden { display: none; }
-    </style>
-</head>
-<body>
-    <h1>YouTube Podcast Generator</h1>
-
-    <div class="card">
-        <h2>Add YouTube Channel</h2>
-        <form id="add-form">
-            <input type="text" id="channel-url" class="url-input" placeholder="YouTube channel URL, @handle, or channel ID" required>
-            <button type="submit">Add Channel</button>
-        </form>
-        <p class="loading" id="add-loading">Adding channel and downloading videos...</p>
-        <div id="add-message"></div>
-    </div>
-
-    <div class="card">
-        <h2>Your Channels</h2>
-        <button class="secondary" onclick="refreshAll()">Refresh All Channels</button>
-        <div id="channels-list"></div>
-    </div>
-
-    <script>
-        const BASE_URL = '""" + BASE_URL + """';
-
-        function getAuthBadge(authType) {
-            const labels = { none: 'Public', basic: 'Password', token: 'Token' };
-            return `<span class="auth-badge ${authType}">${labels[authType] || 'Public'}</span>`;
-        }
-
-        function getFeedUrl(ch) {
-            if (ch.auth_type === 'token' && ch.secret_token) {
-                return `${BASE_URL}/feed/t/${ch.secret_token}`;
-            } else if (ch.auth_type === 'basic' && ch.username) {
-                return `${BASE_URL.replace('://', '://' + ch.username + ':PASSWORD@')}/feed/${ch.id}`;
-            }
-            return `${BASE_URL}/feed/${ch.id}`;
-        }
-
-        async function loadChannels() {
-            const response = await fetch('/channels');
-            const channels = await response.json();
-            const list = document.getElementById('channels-list');
-
-            if (channels.length === 0) {
-                list.innerHTML = '<p>No channels added yet.</p>';
-                return;
-            }
-
-            list.innerHTML = channels.map(ch => `
-                <div class="channel">
-                    <div class="channel-header">
-                        <div>
-                            <span class="channel-name">${ch.name}</span>
-                            ${getAuthBadge(ch.auth_type || 'none')}
-                        </div>
-                        <div class="channel-actions">
-                            <button class="secondary small" onclick="refreshChannel(${ch.id})">Refresh</button>
-                            <button class="danger small" onclick="deleteChannel(${ch.id})">Delete</button>
-                        </div>
-                    </div>
-                    <div class="feed-url">
-                        RSS Feed: <code>${getFeedUrl(ch)}</code>
-                        <a href="${ch.auth_type === 'token' ? getFeedUrl(ch) : '/feed/' + ch.id}" target="_blank">(open)</a>
-                    </div>
-                    <div class="auth-section">
-                        <strong>Authentication:</strong>
-                        <select id="auth-type-${ch.id}" onchange="toggleAuthForm(${ch.id})">
-                            <option value="none" ${ch.auth_type === 'none' ? 'selected' : ''}>None (Public)</option>
-                            <option value="basic" ${ch.auth_type === 'basic' ? 'selected' : ''}>Password (HTTP Basic)</option>
-                            <option value="token" ${ch.auth_type === 'token' ? 'selected' : ''}>Secret Token URL</option>
-                        </select>
-                        <div id="auth-form-${ch.id}" class="auth-form">
-                            <span id="basic-fields-${ch.id}" class="${ch.auth_type === 'basic' ? '' : 'hidden'}">
-                                <input type="text" id="username-${ch.id}" placeholder="Username" value="${ch.username || ''}">
-                                <input type="password" id="password-${ch.id}" placeholder="Password">
-                            </span>
-                            <button class="secondary small" onclick="saveAuth(${ch.id})">Save</button>
-                        </div>
-                    </div>
-                </div>
-            `).join('');
-        }
-
-        function toggleAuthForm(id) {
-            const authType = document.getElementById(`auth-type-${id}`).value;
-            const basicFields = document.getElementById(`basic-fields-${id}`);
-            basicFields.classList.toggle('hidden', authType !== 'basic');
-        }
-
-        async function saveAuth(id) {
-            const authType = document.getElementById(`auth-type-${id}`).value;
-            const username = document.getElementById(`username-${id}`)?.value;
-            const password = document.getElementById(`password-${id}`)?.value;
-
-            const body = { auth_type: authType };
-            if (authType === 'basic') {
-                if (!username || !password) {
-                    alert('Username and password are required');
-                    return;
-                }
-                body.username = username;
-                body.password = password;
-            }
-
-            const response = await fetch(`/channels/${id}/auth`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(body)
-            });
-
-            const data = await response.json();
-            if (response.ok) {
-                if (data.token) {
-                    alert('Token generated! Your feed URL has been updated.');
-                }
-                loadChannels();
-            } else {
-                alert('Error: ' + data.error);
-            }
-        }
-
-        document.getElementById('add-form').addEventListener('submit', async (e) => {
-            e.preventDefault();
-            const url = document.getElementById('channel-url').value;
-            const loading = document.getElementById('add-loading');
-            const message = document.getElementById('add-message');
-
-            loading.style.display = 'block';
-            message.innerHTML = '';
-
-            try {
-                const response = await fetch('/channels', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ url })
-                });
-
-                const data = await response.json();
-
-                if (response.ok) {
-                    message.innerHTML = `<div class="message success">Added "${data.name}" successfully!</div>`;
-                    document.getElementById('channel-url').value = '';
-                    loadChannels();
-                } else {
-                    message.innerHTML = `<div class="message error">${data.error}</div>`;
-                }
-            } catch (err) {
-                message.innerHTML = `<div class="message error">Error: ${err.message}</div>`;
-            }
-
-            loading.style.display = 'none';
-        });
-
-        async function deleteChannel(id) {
-            if (!confirm('Are you sure? This will delete all downloaded episodes.')) return;
-            await fetch(`/channels/${id}`, { method: 'DELETE' });
-            loadChannels();
-        }
-
-        async function refreshChannel(id) {
-            alert('Refresh started. This may take a while.');
-            await fetch(`/refresh/${id}`, { method: 'POST' });
-            alert('Refresh complete!');
-            loadChannels();
-        }
-
-        async function refreshAll() {
-            alert('Refreshing all channels. This may take a while.');
-            await fetch('/refresh', { method: 'POST' });
-            alert('Refresh complete!');
-            loadChannels();
-        }
-
-        loadChannels();
-    </script>
-</body>
-</html>
-"""
+# Background scheduler; also runs refreshes queued from the API
+scheduler = create_scheduler()
+
+
+def _on_refresh_event(event):
+    """Refresh jobs change channel state, so drop the cached channel list."""
+    cache.delete('channels_list')
+
+
+def _on_refresh_failed(event):
+    """Mark channels whose queued refresh was missed or crashed, so they do not stay 'queued'."""
+    if not event.job_id.startswith(QUEUED_JOB_PREFIX):
+        return
+    channel_id = int(event.job_id.removeprefix(QUEUED_JOB_PREFIX))
+    logger.warning("Queued refresh of channel %s did not complete", channel_id)
+    Channel.set_refresh_status(channel_id, 'error')
+    cache.delete('channels_list')
+
+
+scheduler.add_listener(_on_refresh_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+scheduler.add_listener(_on_refresh_failed, EVENT_JOB_MISSED | EVENT_JOB_ERROR)
+
+
+def start_scheduler():
+    """
+    Start the background scheduler in this process.
+    Only one process (the first to take the scheduler lock) runs the periodic
+    refreshes; other gunicorn workers only run refreshes queued through them.
+    """
+    if acquire_scheduler_lock():
+        schedule_channel_refreshes(scheduler)
+        logger.info("Scheduler started. Checking for new videos every %s hours", CHECK_INTERVAL_HOURS)
+    else:
+        logger.info("Scheduler started for queued refreshes only")
+    scheduler.start()
+
+
+def queue_refresh(channel: dict):
+    """Queue a refresh of a single channel on the background scheduler."""
+    Channel.set_refresh_status(channel['id'], 'queued')
+    scheduler.add_job(
+        refresh_channel,
+        args=[channel],
+        kwargs={'force': True},
+        id=f"{QUEUED_JOB_PREFIX}{channel['id']}",
+        replace_existing=True
+    )
+    cache.delete('channels_list')
+
+
+def feed_fingerprint(channel: dict) -> tuple[str, datetime | None]:
+    """Get a cheap fingerprint of a channel's feed and when its latest episode was downloaded."""
+    count, downloaded = Episode.get_feed_fingerprint(channel['id'])
+    fingerprint = f"{count}:{downloaded}:{channel.get('auth_type')}:{channel.get('secret_token')}"
+    if isinstance(downloaded, str):
+        downloaded = datetime.fromisoformat(downloaded)
+    if downloaded:
+        # Download times are stored as naive local time
+        downloaded = downloaded.astimezone(timezone.utc)
+    return fingerprint, downloaded
+
+
+def _feed_render_lock(channel_id: int) -> threading.Lock:
+    """Get the feed render lock for a channel."""
+    with _feed_render_locks_guard:
+        return _feed_render_locks.setdefault(channel_id, threading.Lock())
+
+
+def render_feed(channel: dict, fingerprint: str) -> tuple[str, bytes]:
+    """Get a channel's RSS feed and its ETag, reusing the cached XML while episodes are unchanged."""
+    key = f"feed:{channel['id']}"
+    cached = cache.get(key)
+    if cached and cached[0] == fingerprint:
+        return cached[1], cached[2]
+
+    # Render once when several podcast apps poll a stale feed at the same time
+    with _feed_render_lock(channel['id']):
+        cached = cache.get(key)
+        if cached and cached[0] == fingerprint:
+            return cached[1], cached[2]
+
+        episodes = Episode.get_by_channel(channel['id'])
+        rss = generate_feed(channel, episodes)
+        etag = hashlib.blake2b(rss, digest_size=16).hexdigest()
+        cache.set(key, (fingerprint, etag, rss))
+    return etag, rss
+
+
+def matching_etag(etag: str) -> str | None:
+    """
+    Find the If-None-Match tag for etag, accepting the ':<encoding>' suffix
+    flask-compress adds to ETags. Returns the tag as sent, or None.
+    """
+    if_none_match = request.if_none_match
+    if if_none_match.star_tag:
+        return etag
+    return next((tag for tag in if_none_match if tag.split(':', 1)[0] == etag), None)
+
+
+def feed_response(channel: dict) -> Response:
+    """Build a conditional RSS response, answering 304 when the ETag of the cached XML matches."""
+    fingerprint, last_modified = feed_fingerprint(channel)
+    etag, rss = render_feed(channel, fingerprint)
+
+    # A 304 repeats the validator the client holds, which for compressed
+    # responses carries the encoding suffix
+    matched = matching_etag(etag)
+    if matched:
+        response = Response(status=304)
+        response.set_etag(matched)
+    else:
+        response = Response(rss, mimetype='application/rss+xml')
+        g.compress_key = f"feed:{channel['id']}:{etag}"
+        response.set_etag(etag)
+
+    # Publish dates only have day precision, so use the download time; otherwise
+    # clients sending only If-Modified-Since miss a second episode the same day
+    if last_modified:
+        response.last_modified = last_modified
+    # Basic-auth feeds must not end up in shared caches
+    response.cache_control.max_age = 300
+    if channel.get('auth_type') == 'basic':
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response.make_conditional(request)
+
+
+def audio_response(filename: str, private: bool = False) -> Response:
+    """Serve an audio file, delegating the transfer to nginx/Apache when configured."""
+    if AUDIO_ACCEL_REDIRECT:
+        response = Response(mimetype='audio/mpeg')
+        response.headers['X-Accel-Redirect'] = AUDIO_ACCEL_REDIRECT.rstrip('/') + '/' + filename
+    elif AUDIO_SENDFILE:
+        path = safe_join(AUDIO_DIR_STR, filename)
+        if path is None:
+            return jsonify({'error': 'Audio not found'}), 404
+        response = Response(mimetype='audio/mpeg')
+        response.headers['X-Sendfile'] = path
+    else:
+        # Conditional responses honor Range/If-Range (206) and If-None-Match (304),
+        # so podcast apps can probe tags and seek without fetching the whole file
+        response = send_from_directory(AUDIO_DIR_STR, filename, conditional=True, etag=True, max_age=86400)
+
+    # The front-end server passes these through; password-protected audio
+    # must not end up in shared caches
+    response.cache_control.max_age = 86400
+    if private:
+        response.cache_control.public = False
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
+
+
+def invalidate_feed(channel_id: int):
+    """Drop the cached feed for a channel."""
+    cache.delete(f'feed:{channel_id}')
+
+
+# The web UI lives in static/index.html; fill in the public base URL,
+# then encode and hash it once since it never changes at runtime
+_INDEX_BYTES = (STATIC_DIR / 'index.html').read_text(encoding='utf-8').replace(
+    '{{BASE_URL}}', html.escape(BASE_URL)
+).encode('utf-8')
+_INDEX_ETAG = hashlib.blake2b(_INDEX_BYTES, digest_size=16).hexdigest()
+_INDEX_HEADERS = {
+    'Content-Type': 'text/html; charset=utf-8',
+    'Cache-Control': 'private, max-age=60',
+}
 
 
 @app.route('/')
 @require_admin_auth
 def index():
     """Serve the web UI."""
-    return HTML_TEMPLATE
+    response = Response(_INDEX_BYTES, headers=_INDEX_HEADERS)
+    response.set_etag(_INDEX_ETAG)
+    g.compress_key = f'index:{_INDEX_ETAG}'
+    return response.make_conditional(request)
 
 
 @app.route('/channels', methods=['GET'])
 @require_admin_auth
 def list_channels():
     """List all channels."""
-    channels = Channel.get_all()
-    return jsonify(channels)
+    channels = cache.get('channels_list')
+    if channels is None:
+        channels = Channel.get_all()
+        cache.set('channels_list', channels, timeout=60)
+    response = jsonify(channels)
+    response.add_etag()
+    g.compress_key = f'channels:{response.get_etag()[0]}'
+    return response.make_conditional(request)
 
 
 @app.route('/channels', methods=['POST'])
@@ -344,18 +357,19 @@ def add_channel():
             url=f"https://www.youtube.com/channel/{channel_id}"
         )
 
-        # Fetch and download initial videos
+        # Fetch and download initial videos in the background
         channel = Channel.get_by_id(channel_db_id)
-        refresh_channel(channel)
+        queue_refresh(channel)
 
         return jsonify({
             'id': channel_db_id,
             'name': channel_name,
-            'youtube_channel_id': channel_id
-        }), 201
+            'youtube_channel_id': channel_id,
+            'refresh_status': 'queued'
+        }), 202
 
     except Exception as e:
-        logger.error(f"Failed to add channel: {e}")
+        logger.error("Failed to add channel: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -365,30 +379,36 @@ def delete_channel(channel_id):
     """Delete a channel and its episodes."""
     channel = Channel.get_by_id(channel_id)
     if not channel:
-        return jsonify({'error': 'Channel not found'}), 404
+        return json_response(_CHANNEL_NOT_FOUND, 404)
+
+    # Drop any pending background refresh and the periodic refresh job
+    for job_id in (f'{QUEUED_JOB_PREFIX}{channel_id}', f'{PERIODIC_JOB_PREFIX}{channel_id}'):
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
 
     # Delete audio files
-    episodes = Episode.get_by_channel(channel_id)
+    episodes = Episode.get_by_channel(channel_id, limit=None)
     for ep in episodes:
-        if ep.get('audio_path'):
-            audio_file = AUDIO_DIR / ep['audio_path']
-            if audio_file.exists():
-                audio_file.unlink()
+        if not ep.get('audio_path'):
+            continue
+        try:
+            os.unlink(os.path.join(AUDIO_DIR_STR, ep['audio_path']))
+        except FileNotFoundError:
+            pass
 
     # Delete from database
-    Episode.delete_by_channel(channel_id)
     Channel.delete(channel_id)
+    invalidate_feed(channel_id)
+    cache.delete('channels_list')
 
-    return jsonify({'success': True})
+    return json_response(_SUCCESS)
 
 
 @app.route('/feed/<int:channel_id>')
 @require_auth
 def get_feed(channel_id, channel=None):
     """Get RSS feed for a channel (with auth check)."""
-    episodes = Episode.get_by_channel(channel_id)
-    rss = generate_feed(channel, episodes)
-    return Response(rss, mimetype='application/rss+xml')
+    return feed_response(channel)
 
 
 @app.route('/feed/t/<token>')
@@ -401,9 +421,7 @@ def get_feed_by_token(token):
     if channel.get('auth_type') != 'token':
         return jsonify({'error': 'Token access not enabled for this channel'}), 403
 
-    episodes = Episode.get_by_channel(channel['id'])
-    rss = generate_feed(channel, episodes)
-    return Response(rss, mimetype='application/rss+xml')
+    return feed_response(channel)
 
 
 @app.route('/audio/<filename>')
@@ -418,14 +436,14 @@ def serve_audio(filename):
 
     channel = Channel.get_by_id(episode['channel_id'])
     if not channel:
-        return jsonify({'error': 'Channel not found'}), 404
+        return json_response(_CHANNEL_NOT_FOUND, 404)
 
     # Check authentication
     if not check_auth(channel):
         if channel.get('auth_type') == 'token':
             # For token auth, check if token is in query string
             token = request.args.get('token')
-            if token != channel.get('secret_token'):
+            if not token or not hmac.compare_digest(token.encode(), (channel.get('secret_token') or '').encode()):
                 return jsonify({'error': 'Authentication required'}), 401
         else:
             return Response(
@@ -434,7 +452,7 @@ def serve_audio(filename):
                 {'WWW-Authenticate': 'Basic realm="Podcast Audio"'}
             )
 
-    return send_from_directory(AUDIO_DIR, filename)
+    return audio_response(filename, private=channel.get('auth_type') == 'basic')
 
 
 @app.route('/audio/t/<token>/<filename>')
@@ -451,7 +469,7 @@ def serve_audio_by_token(token, filename):
     if not episode or episode['channel_id'] != channel['id']:
         return jsonify({'error': 'Audio not found'}), 404
 
-    return send_from_directory(AUDIO_DIR, filename)
+    return audio_response(filename)
 
 
 @app.route('/channels/<int:channel_id>/auth', methods=['POST'])
@@ -460,7 +478,7 @@ def update_channel_auth(channel_id):
     """Update authentication settings for a channel."""
     channel = Channel.get_by_id(channel_id)
     if not channel:
-        return jsonify({'error': 'Channel not found'}), 404
+        return json_response(_CHANNEL_NOT_FOUND, 404)
 
     data = request.get_json()
     auth_type = data.get('auth_type', 'none')
@@ -472,26 +490,35 @@ def update_channel_auth(channel_id):
             if not username or not password:
                 return jsonify({'error': 'Username and password required'}), 400
             Channel.update_auth(channel_id, 'basic', username=username, password=password)
-            return jsonify({'success': True, 'auth_type': 'basic'})
+            result = {'success': True, 'auth_type': 'basic'}
 
         elif auth_type == 'token':
             token = Channel.update_auth(channel_id, 'token')
-            return jsonify({'success': True, 'auth_type': 'token', 'token': token})
+            result = {'success': True, 'auth_type': 'token', 'token': token}
 
         else:
             Channel.update_auth(channel_id, 'none')
-            return jsonify({'success': True, 'auth_type': 'none'})
+            result = {'success': True, 'auth_type': 'none'}
 
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
 
+    # Invalidate only after the write, so a concurrent GET cannot re-cache old auth
+    invalidate_feed(channel_id)
+    cache.delete('channels_list')
+    return jsonify(result)
+
 
 @app.route('/refresh', methods=['POST'])
 @require_admin_auth
 def refresh_all():
     """Manually trigger refresh of all channels."""
-    refresh_all_channels()
-    return jsonify({'success': True})
+    # One job per channel, so the scheduler pool caps how many run at once
+    for channel in Channel.get_all():
+        if is_refresh_running(channel['id']) or scheduler.get_job(f"{QUEUED_JOB_PREFIX}{channel['id']}"):
+            continue
+        queue_refresh(channel)
+    return jsonify({'success': True, 'refresh_status': 'queued'}), 202
 
 
 @app.route('/refresh/<int:channel_id>', methods=['POST'])
@@ -500,18 +527,34 @@ def refresh_single(channel_id):
     """Manually trigger refresh of a single channel."""
     channel = Channel.get_by_id(channel_id)
     if not channel:
-        return jsonify({'error': 'Channel not found'}), 404
+        return json_response(_CHANNEL_NOT_FOUND, 404)
 
-    refresh_channel(channel)
-    return jsonify({'success': True})
+    if is_refresh_running(channel_id) or scheduler.get_job(f'{QUEUED_JOB_PREFIX}{channel_id}'):
+        return jsonify({'status': 'already_running'}), 202
+
+    queue_refresh(channel)
+    return jsonify({'success': True, 'refresh_status': 'queued'}), 202
+
+
+@app.route('/admin/cache', methods=['GET'])
+@require_admin_auth
+def metadata_cache_stats():
+    """Show hit/miss statistics of the YouTube metadata cache."""
+    return jsonify(get_metadata_cache_stats())
+
+
+@app.route('/admin/cache/clear', methods=['POST'])
+@require_admin_auth
+def metadata_cache_clear():
+    """Drop all cached YouTube metadata and channel video lists."""
+    removed = clear_metadata_cache()
+    return jsonify({'success': True, 'removed': removed})
 
 
 if __name__ == '__main__':
-    # Start the scheduler
-    scheduler = create_scheduler()
-    scheduler.start()
-    logger.info(f"Scheduler started. Checking for new videos every {scheduler.get_job('refresh_channels').trigger} hours")
+    # Development server; use gunicorn (see gunicorn.conf.py) in production
+    reset_refresh_status()
+    start_scheduler()
 
-    # Run the Flask app
-    logger.info(f"Starting server at {BASE_URL}")
-    app.run(host=HOST, port=PORT, debug=False)
+    logger.info("Starting server at %s", BASE_URL)
+    app.run(host=HOST, port=PORT, debug=False, threaded=True)
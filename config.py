@@ -5,12 +5,20 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent.absolute()
 DATA_DIR = BASE_DIR / "data"
 AUDIO_DIR = DATA_DIR / "audio"
+AUDIO_DIR_STR = str(AUDIO_DIR)  # for os.path calls in per-request code
 DATABASE_PATH = DATA_DIR / "podcast.db"
+STATIC_DIR = BASE_DIR / "static"
+SCHEDULER_LOCK_PATH = DATA_DIR / "scheduler.lock"
+DB_INIT_LOCK_PATH = DATA_DIR / "init.lock"
+METADATA_CACHE_DIR = DATA_DIR / ".metadata_cache"
 
 # Ensure directories exist
 DATA_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
+# Idle SQLite connections kept open for reuse
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+
 # Server settings
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 5000))
@@ -18,11 +26,43 @@ BASE_URL = os.getenv("BASE_URL", f"http://localhost:{PORT}")
 
 # Scheduler settings
 CHECK_INTERVAL_HOURS = int(os.getenv("CHECK_INTERVAL_HOURS", 1))
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", 4))
 
 # Download settings
 INITIAL_FETCH_COUNT = int(os.getenv("INITIAL_FETCH_COUNT", 10))
+# Failed videos are retried with doubling delays, then given up on after this many attempts
+MAX_DOWNLOAD_ATTEMPTS = int(os.getenv("MAX_DOWNLOAD_ATTEMPTS", 10))
 AUDIO_FORMAT = "mp3"
 AUDIO_BITRATE = "192"
 
+# Feed settings
+FEED_EPISODE_LIMIT = int(os.getenv("FEED_EPISODE_LIMIT", 100))
+# Longest episode description kept (iTunes limit)
+DESCRIPTION_MAX_LENGTH = 4000
+
+# Concurrent YouTube requests per channel refresh
+METADATA_WORKERS = int(os.getenv("METADATA_WORKERS", 4))
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 2))
+# Cap on simultaneous YouTube lookups (metadata, listings) across all refreshes
+YOUTUBE_CONCURRENCY = int(os.getenv("YOUTUBE_CONCURRENCY", 8))
+# Separate cap on simultaneous audio downloads, so long transfers never starve lookups
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", 4))
+
+# Seconds to reuse YouTube lookups; keep the channel list short so new uploads show up
+VIDEO_METADATA_CACHE_TTL = int(os.getenv("VIDEO_METADATA_CACHE_TTL", 86400))
+CHANNEL_LIST_CACHE_TTL = int(os.getenv("CHANNEL_LIST_CACHE_TTL", 600))
+# Per-process channel lookups; bounds how long other workers use old auth settings
+CHANNEL_CACHE_TTL = int(os.getenv("CHANNEL_CACHE_TTL", 5))
+
+# Audio offloading to a front-end server (empty/false serves audio from Flask)
+# AUDIO_ACCEL_REDIRECT: nginx internal location prefix, e.g. "/_internal_audio/"
+# AUDIO_SENDFILE: set to "true" for Apache mod_xsendfile
+AUDIO_ACCEL_REDIRECT = os.getenv("AUDIO_ACCEL_REDIRECT", "")
+AUDIO_SENDFILE = os.getenv("AUDIO_SENDFILE", "").lower() in ("1", "true", "yes")
+
+# Response cache (flask-caching); use RedisCache to share it between processes
+CACHE_TYPE = os.getenv("CACHE_TYPE", "SimpleCache")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+
 # Admin authentication (required when set)
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "")
@@ -1,9 +1,65 @@
 import os
 import re
+import atexit
+import logging
+import itertools
+import threading
+import weakref
 import yt_dlp
+from diskcache import Cache
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from config import AUDIO_DIR, AUDIO_FORMAT, AUDIO_BITRATE, INITIAL_FETCH_COUNT
+from config import (AUDIO_DIR, AUDIO_FORMAT, AUDIO_BITRATE, INITIAL_FETCH_COUNT,
+                    METADATA_WORKERS, YOUTUBE_CONCURRENCY, DOWNLOAD_CONCURRENCY, METADATA_CACHE_DIR,
+                    VIDEO_METADATA_CACHE_TTL, CHANNEL_LIST_CACHE_TTL)
+
+logger = logging.getLogger(__name__)
+
+# Process-wide caps on in-flight YouTube requests, however many channels refresh at once.
+# Downloads hold a slot for the whole transfer, so they get their own and never block lookups
+_youtube_slots = threading.BoundedSemaphore(YOUTUBE_CONCURRENCY)
+_download_slots = threading.BoundedSemaphore(DOWNLOAD_CONCURRENCY)
+
+# Persistent cache of YouTube lookups, shared by all processes
+metadata_cache = Cache(str(METADATA_CACHE_DIR), tag_index=True)
+metadata_cache.stats(enable=True)
+
+# Long-lived metadata workers, so their YoutubeDL instances (and HTTP
+# connections) are reused across videos and refreshes
+_METADATA_POOL = ThreadPoolExecutor(max_workers=METADATA_WORKERS, thread_name_prefix='metadata')
+
+# Bare YouTube channel ID, e.g. UCxxxxxxxxxxxxxxxxxxxxxx
+_CHANNEL_ID_RE = re.compile(r'^UC[\w-]{22}$')
+
+# Marks a cache miss, since cached values may be falsy
+_MISSING = object()
+
+# YoutubeDL is not thread-safe, so instances are shared per thread and options
+_local = threading.local()
+_ydl_instances = weakref.WeakSet()
+
+
+def _get_ydl(ydl_opts: dict) -> yt_dlp.YoutubeDL:
+    """Get this thread's shared YoutubeDL instance for the given options."""
+    instances = getattr(_local, 'ydl_instances', None)
+    if instances is None:
+        instances = _local.ydl_instances = {}
+
+    opts_key = tuple(sorted(ydl_opts.items()))
+    ydl = instances.get(opts_key)
+    if ydl is None:
+        ydl = instances[opts_key] = yt_dlp.YoutubeDL(ydl_opts)
+        _ydl_instances.add(ydl)
+    return ydl
+
+
+@atexit.register
+def _close_ydl_instances():
+    """Close shared YoutubeDL instances on shutdown."""
+    for ydl in list(_ydl_instances):
+        ydl.close()
 
 
 def extract_channel_id(url_or_id: str) -> tuple[str, str]:
@@ -21,7 +77,7 @@ def extract_channel_id(url_or_id: str) -> tuple[str, str]:
     url = url_or_id.strip()
 
     # If it looks like just a channel ID
-    if re.match(r'^UC[\w-]{22}$', url):
+    if _CHANNEL_ID_RE.match(url):
         url = f"https://www.youtube.com/channel/{url}"
     # If it's a handle without URL
     elif url.startswith('@'):
@@ -30,45 +86,73 @@ def extract_channel_id(url_or_id: str) -> tuple[str, str]:
     elif not url.startswith('http'):
         url = f"https://www.youtube.com/@{url}"
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        channel_id = info.get('channel_id') or info.get('id')
-        channel_name = info.get('channel') or info.get('uploader') or info.get('title', 'Unknown Channel')
-        return channel_id, channel_name
+    with _youtube_slots:
+        info = _get_ydl(ydl_opts).extract_info(url, download=False)
+
+    channel_id = info.get('channel_id') or info.get('id')
+    channel_name = info.get('channel') or info.get('uploader') or info.get('title', 'Unknown Channel')
+    return channel_id, channel_name
 
 
-def fetch_channel_videos(channel_id: str, max_videos: int = INITIAL_FETCH_COUNT) -> list[dict]:
+def fetch_channel_videos(channel_id: str, max_videos: int = INITIAL_FETCH_COUNT,
+                         known_ids: Iterable[str] = (), force: bool = False) -> tuple[list[dict], bool]:
     """
-    Fetch video list from a YouTube channel.
-    Returns list of video metadata dicts.
+    Fetch video list from a YouTube channel, newest first.
+    Stops at the first video in known_ids, since every video after it is older.
+    Unless force is set, a list fetched within CHANNEL_LIST_CACHE_TTL is reused.
+    Returns (list of video metadata dicts, whether the list came from YouTube).
     """
+    # Sorted, so the same known videos always give the same cache key
+    args = (channel_id, max_videos, tuple(sorted(known_ids)))
+    key = _fetch_channel_videos.__cache_key__(*args)
+
+    if not force:
+        videos = metadata_cache.get(key, default=_MISSING, retry=True)
+        if videos is not _MISSING:
+            return videos, False
+
+    videos = _fetch_channel_videos.__wrapped__(*args)
+    metadata_cache.set(key, videos, expire=CHANNEL_LIST_CACHE_TTL, tag='channel_list', retry=True)
+    return videos, True
+
+
+@metadata_cache.memoize(expire=CHANNEL_LIST_CACHE_TTL, tag='channel_list')
+def _fetch_channel_videos(channel_id: str, max_videos: int, known_ids: tuple[str, ...]) -> list[dict]:
+    """Fetch a channel's newest videos up to the first known one."""
     ydl_opts = {
         'quiet': True,
         'extract_flat': True,
         'no_warnings': True,
-        'playlistend': max_videos,
     }
 
     url = f"https://www.youtube.com/channel/{channel_id}/videos"
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-
-        videos = []
-        entries = info.get('entries', [])
-
-        for entry in entries[:max_videos]:
+    known = set(known_ids)
+    videos = []
+
+    with _youtube_slots:
+        # Unprocessed, entries is the extractor's lazy generator, so further
+        # pages are only requested while we keep iterating
+        ydl = _get_ydl(ydl_opts)
+        info = ydl.extract_info(url, download=False, process=False)
+        # Unprocessed results are not followed, e.g. YouTube's regional channel redirect
+        if info.get('_type') == 'url':
+            info = ydl.extract_info(info['url'], download=False, process=False)
+
+        for entry in itertools.islice(info.get('entries') or (), max_videos):
             if entry is None:
                 continue
+            if entry.get('id') in known:
+                break
             videos.append({
                 'video_id': entry.get('id'),
                 'title': entry.get('title'),
                 'url': entry.get('url') or f"https://www.youtube.com/watch?v={entry.get('id')}",
             })
 
-        return videos
+    return videos
 
 
+@metadata_cache.memoize(expire=VIDEO_METADATA_CACHE_TTL, tag='video_meta')
 def get_video_metadata(video_id: str) -> dict:
     """
     Get detailed metadata for a video.
@@ -80,26 +164,34 @@ def get_video_metadata(video_id: str) -> dict:
 
     url = f"https://www.youtube.com/watch?v={video_id}"
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+    with _youtube_slots:
+        info = _get_ydl(ydl_opts).extract_info(url, download=False)
+
+    # Parse upload date
+    upload_date = info.get('upload_date')
+    published_at = None
+    if upload_date:
+        try:
+            published_at = datetime.strptime(upload_date, '%Y%m%d')
+        except ValueError:
+            pass
+
+    return {
+        'video_id': video_id,
+        'title': info.get('title', 'Untitled'),
+        'description': info.get('description', ''),
+        'duration': info.get('duration', 0),
+        'published_at': published_at,
+        'thumbnail_url': info.get('thumbnail'),
+    }
 
-        # Parse upload date
-        upload_date = info.get('upload_date')
-        published_at = None
-        if upload_date:
-            try:
-                published_at = datetime.strptime(upload_date, '%Y%m%d')
-            except ValueError:
-                pass
 
-        return {
-            'video_id': video_id,
-            'title': info.get('title', 'Untitled'),
-            'description': info.get('description', ''),
-            'duration': info.get('duration', 0),
-            'published_at': published_at,
-            'thumbnail_url': info.get('thumbnail'),
-        }
+def submit_video_metadata(video_ids: list[str]) -> dict[Future, str]:
+    """
+    Start fetching detailed metadata for several videos on the metadata workers.
+    Returns dict of Future -> video_id; each future resolves to the metadata dict.
+    """
+    return {_METADATA_POOL.submit(get_video_metadata, video_id): video_id for video_id in video_ids}
 
 
 def download_audio(video_id: str) -> tuple[str, int]:
@@ -112,20 +204,29 @@ def download_audio(video_id: str) -> tuple[str, int]:
 
     ydl_opts = {
         'format': 'bestaudio/best',
+        'outtmpl': output_template,
+        'quiet': True,
+        'no_warnings': True,
+    }
+    convert_opts = {
+        **ydl_opts,
         'postprocessors': [{
             'key': 'FFmpegExtractAudio',
             'preferredcodec': AUDIO_FORMAT,
             'preferredquality': AUDIO_BITRATE,
         }],
-        'outtmpl': output_template,
-        'quiet': True,
-        'no_warnings': True,
     }
 
     url = f"https://www.youtube.com/watch?v={video_id}"
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+    # Only the download talks to YouTube; the ffmpeg conversion can take minutes
+    # of CPU, so run it after giving the slot back
+    with _download_slots, yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+
+    downloaded = info['requested_downloads'][0]
+    with yt_dlp.YoutubeDL(convert_opts) as ydl:
+        ydl.post_process(downloaded['filepath'], downloaded)
 
     if final_path.exists():
         file_size = final_path.stat().st_size
@@ -134,9 +235,12 @@ def download_audio(video_id: str) -> tuple[str, int]:
     raise FileNotFoundError(f"Downloaded audio file not found: {final_path}")
 
 
-def get_audio_file_size(filename: str) -> int:
-    """Get the size of an audio file in bytes."""
-    path = AUDIO_DIR / filename
-    if path.exists():
-        return path.stat().st_size
-    return 0
+def get_metadata_cache_stats() -> dict:
+    """Get hit/miss counters and size of the metadata cache."""
+    hits, misses = metadata_cache.stats()
+    return {'hits': hits, 'misses': misses, 'entries': len(metadata_cache)}
+
+
+def clear_metadata_cache() -> int:
+    """Drop cached video metadata and channel lists. Returns the number of entries removed."""
+    return metadata_cache.evict('video_meta') + metadata_cache.evict('channel_list')
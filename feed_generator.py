@@ -1,8 +1,17 @@
 from datetime import datetime, timezone
+from collections.abc import Iterable
+from email.utils import format_datetime
 from urllib.parse import urlparse
-from feedgen.feed import FeedGenerator
+from lxml import etree
 from config import BASE_URL, AUDIO_FORMAT
-from downloader import get_audio_file_size
+
+ITUNES_NS = 'http://www.itunes.com/dtds/podcast-1.0.dtd'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+NSMAP = {'itunes': ITUNES_NS, 'atom': ATOM_NS}
+
+# Qualified tag names, built once
+_ITUNES = '{%s}' % ITUNES_NS
+_ATOM_LINK = '{%s}link' % ATOM_NS
 
 
 def is_valid_itunes_image_url(url: str) -> bool:
@@ -14,80 +23,100 @@ def is_valid_itunes_image_url(url: str) -> bool:
     return path.endswith('.png') or path.endswith('.jpg') or path.endswith('.jpeg')
 
 
-def generate_feed(channel: dict, episodes: list) -> str:
+def _sub(parent: etree._Element, tag: str, content: str = None, **attrib) -> etree._Element:
+    """Append a child element with optional text content and attributes."""
+    element = etree.SubElement(parent, tag, attrib)
+    if content is not None:
+        element.text = content
+    return element
+
+
+def _parse_date(value) -> datetime:
+    """Parse a stored publish date into an aware datetime (naive dates are UTC)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def generate_feed(channel: dict, episodes: Iterable[dict]) -> bytes:
     """
     Generate a podcast RSS 2.0 feed with iTunes extensions.
 
     Args:
         channel: Channel dict with id, name, youtube_channel_id, url, auth_type, secret_token
-        episodes: List of episode dicts
+        episodes: Iterable of episode dicts, newest first
 
     Returns:
-        RSS XML string
+        RSS XML as UTF-8 bytes
     """
-    fg = FeedGenerator()
-    fg.load_extension('podcast')
-
     # Determine feed URL based on auth type
     auth_type = channel.get('auth_type', 'none')
     if auth_type == 'token' and channel.get('secret_token'):
         feed_url = f"{BASE_URL}/feed/t/{channel['secret_token']}"
+        audio_base = f"{BASE_URL}/audio/t/{channel['secret_token']}/"
     else:
         feed_url = f"{BASE_URL}/feed/{channel['id']}"
+        audio_base = f"{BASE_URL}/audio/"
+    mime_type = f"audio/{AUDIO_FORMAT}"
+
+    rss = etree.Element('rss', version='2.0', nsmap=NSMAP)
+    feed = _sub(rss, 'channel')
 
     # Channel metadata
-    fg.title(channel['name'])
-    fg.description(f"Podcast feed for YouTube channel: {channel['name']}")
-    fg.link(href=channel['url'], rel='alternate')
-    fg.link(href=feed_url, rel='self')
-    fg.language('en')
-    fg.generator('YouTube Podcast Generator')
+    _sub(feed, 'title', channel['name'])
+    _sub(feed, 'link', channel['url'])
+    _sub(feed, 'description', f"Podcast feed for YouTube channel: {channel['name']}")
+    _sub(feed, _ATOM_LINK, href=feed_url, rel='self')
+    _sub(feed, 'docs', 'http://www.rssboard.org/rss-specification')
+    _sub(feed, 'generator', 'YouTube Podcast Generator')
+    _sub(feed, 'language', 'en')
+    # Filled in from the newest episode, so unchanged episodes give identical bytes
+    last_build_date = _sub(feed, 'lastBuildDate')
 
     # iTunes/Podcast specific
-    fg.podcast.itunes_author(channel['name'])
-    fg.podcast.itunes_category('Technology')
-    fg.podcast.itunes_explicit('no')
-    fg.podcast.itunes_owner(name=channel['name'], email='noreply@example.com')
-    fg.podcast.itunes_summary(f"Audio from YouTube channel: {channel['name']}")
+    _sub(feed, _ITUNES + 'author', channel['name'])
+    _sub(feed, _ITUNES + 'category', text='Technology')
+    _sub(feed, _ITUNES + 'explicit', 'no')
+    owner = _sub(feed, _ITUNES + 'owner')
+    _sub(owner, _ITUNES + 'name', channel['name'])
+    _sub(owner, _ITUNES + 'email', 'noreply@example.com')
+    _sub(feed, _ITUNES + 'summary', f"Audio from YouTube channel: {channel['name']}")
 
     # Add episodes
+    latest = None
     for ep in episodes:
         if not ep.get('audio_path'):
             continue
 
-        fe = fg.add_entry()
-        fe.id(ep['video_id'])
-        fe.title(ep['title'])
-
-        # Description
-        description = ep.get('description') or ''
-        fe.description(description[:4000] if description else ep['title'])
-
+        item = _sub(feed, 'item')
+        _sub(item, 'title', ep['title'])
         # Link to original video
-        fe.link(href=f"https://www.youtube.com/watch?v={ep['video_id']}")
-
-        # Publication date
-        if ep.get('published_at'):
-            pub_date = ep['published_at']
-            if isinstance(pub_date, str):
-                pub_date = datetime.fromisoformat(pub_date.replace('Z', '+00:00'))
-            if pub_date.tzinfo is None:
-                pub_date = pub_date.replace(tzinfo=timezone.utc)
-            fe.published(pub_date)
+        _sub(item, 'link', f"https://www.youtube.com/watch?v={ep['video_id']}")
+        _sub(item, 'description', ep.get('description') or ep['title'])
+        _sub(item, 'guid', ep['video_id'], isPermaLink='false')
 
         # Audio enclosure - use token URL if token auth is enabled
-        if auth_type == 'token' and channel.get('secret_token'):
-            audio_url = f"{BASE_URL}/audio/t/{channel['secret_token']}/{ep['audio_path']}"
-        else:
-            audio_url = f"{BASE_URL}/audio/{ep['audio_path']}"
-        file_size = get_audio_file_size(ep['audio_path'])
-        mime_type = f"audio/{AUDIO_FORMAT}"
+        _sub(item, 'enclosure', url=audio_base + ep['audio_path'],
+             length=str(ep.get('file_size') or 0), type=mime_type)
 
-        fe.enclosure(audio_url, str(file_size), mime_type)
+        # Publication date
+        if ep.get('published_at'):
+            pub_date = _parse_date(ep['published_at'])
+            _sub(item, 'pubDate', format_datetime(pub_date))
+            if latest is None or pub_date > latest:
+                latest = pub_date
 
         # iTunes specific
-        fe.podcast.itunes_duration(ep.get('duration', 0))
         if ep.get('thumbnail_url') and is_valid_itunes_image_url(ep['thumbnail_url']):
-            fe.podcast.itunes_image(ep['thumbnail_url'])
+            _sub(item, _ITUNES + 'image', href=ep['thumbnail_url'])
+        if ep.get('duration'):
+            _sub(item, _ITUNES + 'duration', str(ep['duration']))
+
+    if latest:
+        last_build_date.text = format_datetime(latest)
+    else:
+        feed.remove(last_build_date)
 
-    return fg.rss_str(pretty=True).decode('utf-8')
+    return etree.tostring(rss, xml_declaration=True, encoding='UTF-8')
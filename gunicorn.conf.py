@@ -0,0 +1,30 @@
+import os
+
+# Server socket
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+
+# A single threaded worker keeps the scheduler, refresh locks and
+# SimpleCache in one process; raise WEB_WORKERS only with CACHE_TYPE=RedisCache
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_WORKERS', 1))
+threads = int(os.getenv('WEB_THREADS', 8))
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Channel refreshes run in the background, but keep headroom for slow clients
+timeout = 120
+
+
+def on_starting(server):
+    """Set up the database once in the master, before any worker is forked."""
+    from models import init_db, reset_refresh_status, close_pool
+    init_db()
+    reset_refresh_status()
+    # SQLite connections must not be shared with forked workers
+    close_pool()
+
+
+def post_worker_init(worker):
+    """Start the background scheduler inside each worker."""
+    from app import start_scheduler
+    start_scheduler()
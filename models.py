@@ -1,21 +1,57 @@
+import os
+import hmac
+import queue
 import sqlite3
 import secrets
 import hashlib
+import threading
 from datetime import datetime
 from contextlib import contextmanager
-from config import DATABASE_PATH
+from collections.abc import Iterator
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+from config import (DATABASE_PATH, DB_POOL_SIZE, AUDIO_DIR_STR, FEED_EPISODE_LIMIT, DESCRIPTION_MAX_LENGTH,
+                    CHANNEL_CACHE_TTL, DB_INIT_LOCK_PATH)
+
+# Short-lived cache of channel lookups; returned dicts are shared, do not mutate them.
+# It is per process, so other gunicorn workers see auth changes after at most the TTL
+_channel_cache = TTLCache(maxsize=1024, ttl=CHANNEL_CACHE_TTL)
+_channel_cache_lock = threading.Lock()
+
+# Recently verified basic auth credentials, keyed on a digest of the password;
+# same TTL as _channel_cache, so both follow one staleness policy
+_verified_auth = TTLCache(maxsize=1024, ttl=CHANNEL_CACHE_TTL)
+
+# SQLite allows a single writer; serialize writes from concurrent refresh threads
+_write_lock = threading.Lock()
+
+# Idle connections kept open for reuse by get_db()
+_pool = queue.Queue(maxsize=DB_POOL_SIZE)
 
 
 def get_connection():
     """Get a database connection with row factory."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    # Pooled connections move between threads, but only one uses them at a time
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # Enforce ON DELETE CASCADE, so deleting a channel removes its episodes
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
     return conn
 
 
-def hash_password(password: str) -> str:
-    """Hash a password using SHA-256."""
-    return hashlib.sha256(password.encode()).hexdigest()
+def hash_password(password: str, salt: str = None) -> str:
+    """Hash a password using salted BLAKE2b (unsalted SHA-256 for legacy hashes without salt)."""
+    if salt is None:
+        return hashlib.sha256(password.encode()).hexdigest()
+    return hashlib.blake2b(password.encode(), salt=bytes.fromhex(salt), digest_size=32).hexdigest()
+
+
+def generate_salt() -> str:
+    """Generate a random 16-byte password salt as hex."""
+    return secrets.token_hex(16)
 
 
 def generate_token() -> str:
@@ -23,20 +59,73 @@ def generate_token() -> str:
     return secrets.token_urlsafe(32)
 
 
+def invalidate_channel_cache():
+    """Drop all cached channel lookups."""
+    with _channel_cache_lock:
+        _channel_cache.clear()
+        _verified_auth.clear()
+
+
 @contextmanager
 def get_db():
-    """Context manager for database connections."""
-    conn = get_connection()
+    """Context manager for database connections, reusing pooled connections."""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = get_connection()
+
     try:
         yield conn
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
     finally:
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def close_pool():
+    """Close idle pooled connections, e.g. before forking worker processes."""
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            return
         conn.close()
 
 
+@contextmanager
+def get_write_db():
+    """Context manager for connections that modify the database."""
+    with _write_lock, get_db() as conn:
+        yield conn
+
+
+@contextmanager
+def _init_lock():
+    """Serialize database setup between processes (no-op where file locking is unavailable)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+
+    with open(DB_INIT_LOCK_PATH, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
 def init_db():
-    """Initialize the database with required tables."""
-    with get_db() as conn:
+    """
+    Initialize the database with required tables.
+    Safe to call from several gunicorn workers at once; migrations run under a file lock.
+    """
+    with _init_lock(), get_db() as conn:
+        # WAL lets web workers read while the scheduler writes
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("""
             CREATE TABLE IF NOT EXISTS channels (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,7 +136,10 @@ def init_db():
                 auth_type TEXT DEFAULT 'none',
                 username TEXT,
                 password_hash TEXT,
-                secret_token TEXT
+                password_salt TEXT,
+                secret_token TEXT,
+                refresh_status TEXT DEFAULT 'idle',
+                last_checked_at TIMESTAMP
             )
         """)
 
@@ -60,8 +152,15 @@ def init_db():
             conn.execute("ALTER TABLE channels ADD COLUMN username TEXT")
         if 'password_hash' not in columns:
             conn.execute("ALTER TABLE channels ADD COLUMN password_hash TEXT")
+        if 'password_salt' not in columns:
+            conn.execute("ALTER TABLE channels ADD COLUMN password_salt TEXT")
         if 'secret_token' not in columns:
             conn.execute("ALTER TABLE channels ADD COLUMN secret_token TEXT")
+        if 'refresh_status' not in columns:
+            conn.execute("ALTER TABLE channels ADD COLUMN refresh_status TEXT DEFAULT 'idle'")
+        if 'last_checked_at' not in columns:
+            conn.execute("ALTER TABLE channels ADD COLUMN last_checked_at TIMESTAMP")
+
         conn.execute("""
             CREATE TABLE IF NOT EXISTS episodes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -74,11 +173,58 @@ def init_db():
                 audio_path TEXT,
                 downloaded_at TIMESTAMP,
                 thumbnail_url TEXT,
+                file_size INTEGER,
+                download_attempts INTEGER DEFAULT 0,
+                last_attempt_at TIMESTAMP,
                 FOREIGN KEY (channel_id) REFERENCES channels (id) ON DELETE CASCADE
             )
         """)
+
+        # Migration: store audio file sizes so feeds need no filesystem access
+        cursor = conn.execute("PRAGMA table_info(episodes)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'file_size' not in columns:
+            conn.execute("ALTER TABLE episodes ADD COLUMN file_size INTEGER")
+        # Migration: count failed downloads, so failing videos are retried with backoff
+        if 'download_attempts' not in columns:
+            conn.execute("ALTER TABLE episodes ADD COLUMN download_attempts INTEGER DEFAULT 0")
+        if 'last_attempt_at' not in columns:
+            conn.execute("ALTER TABLE episodes ADD COLUMN last_attempt_at TIMESTAMP")
+        rows = conn.execute(
+            "SELECT id, audio_path FROM episodes WHERE file_size IS NULL AND audio_path IS NOT NULL"
+        ).fetchall()
+        for row in rows:
+            try:
+                file_size = os.path.getsize(os.path.join(AUDIO_DIR_STR, row['audio_path']))
+            except OSError:
+                continue
+            conn.execute("UPDATE episodes SET file_size = ? WHERE id = ?", (file_size, row['id']))
+
+        # Episodes of channels deleted before foreign keys were enforced
+        conn.execute("DELETE FROM episodes WHERE channel_id NOT IN (SELECT id FROM channels)")
+
+        # Descriptions are truncated when stored; trim rows saved before that
+        conn.execute(
+            "UPDATE episodes SET description = substr(description, 1, ?) WHERE length(description) > ?",
+            (DESCRIPTION_MAX_LENGTH, DESCRIPTION_MAX_LENGTH)
+        )
+
         conn.execute("CREATE INDEX IF NOT EXISTS idx_episodes_channel ON episodes(channel_id)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_episodes_video ON episodes(video_id)")
+        conn.execute(
+            """CREATE INDEX IF NOT EXISTS idx_episodes_channel_pubdate
+               ON episodes(channel_id, published_at DESC) WHERE audio_path IS NOT NULL"""
+        )
+
+
+def reset_refresh_status():
+    """
+    Mark pending or running refreshes as idle. Queued jobs live only in memory,
+    so call this once per server start, before any worker queues a refresh.
+    """
+    with get_write_db() as conn:
+        conn.execute("UPDATE channels SET refresh_status = 'idle' WHERE refresh_status IN ('queued', 'running')")
+    invalidate_channel_cache()
 
 
 class Channel:
@@ -87,12 +233,13 @@ class Channel:
     @staticmethod
     def create(youtube_channel_id: str, name: str, url: str) -> int:
         """Create a new channel and return its ID."""
-        with get_db() as conn:
+        with get_write_db() as conn:
             cursor = conn.execute(
                 "INSERT INTO channels (youtube_channel_id, name, url) VALUES (?, ?, ?)",
                 (youtube_channel_id, name, url)
             )
-            return cursor.lastrowid
+        invalidate_channel_cache()
+        return cursor.lastrowid
 
     @staticmethod
     def get_all() -> list:
@@ -102,6 +249,16 @@ class Channel:
             return [dict(row) for row in rows]
 
     @staticmethod
+    def get_all_for_refresh() -> list:
+        """Get all channels with just the columns a refresh needs."""
+        with get_db() as conn:
+            rows = conn.execute(
+                "SELECT id, name, youtube_channel_id, last_checked_at FROM channels"
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+    @staticmethod
+    @cached(_channel_cache, key=lambda channel_id: hashkey('id', channel_id), lock=_channel_cache_lock)
     def get_by_id(channel_id: int) -> dict | None:
         """Get a channel by its ID."""
         with get_db() as conn:
@@ -109,6 +266,8 @@ class Channel:
             return dict(row) if row else None
 
     @staticmethod
+    @cached(_channel_cache, key=lambda youtube_channel_id: hashkey('youtube_id', youtube_channel_id),
+            lock=_channel_cache_lock)
     def get_by_youtube_id(youtube_channel_id: str) -> dict | None:
         """Get a channel by its YouTube channel ID."""
         with get_db() as conn:
@@ -121,11 +280,13 @@ class Channel:
     @staticmethod
     def delete(channel_id: int) -> bool:
         """Delete a channel and its episodes."""
-        with get_db() as conn:
+        with get_write_db() as conn:
             cursor = conn.execute("DELETE FROM channels WHERE id = ?", (channel_id,))
-            return cursor.rowcount > 0
+        invalidate_channel_cache()
+        return cursor.rowcount > 0
 
     @staticmethod
+    @cached(_channel_cache, key=lambda token: hashkey('token', token), lock=_channel_cache_lock)
     def get_by_token(token: str) -> dict | None:
         """Get a channel by its secret token."""
         with get_db() as conn:
@@ -142,51 +303,116 @@ class Channel:
         Update authentication settings for a channel.
         Returns the secret token if auth_type is 'token'.
         """
-        with get_db() as conn:
-            if auth_type == 'none':
-                conn.execute(
-                    """UPDATE channels SET auth_type = 'none',
-                       username = NULL, password_hash = NULL, secret_token = NULL
-                       WHERE id = ?""",
-                    (channel_id,)
-                )
-                return None
-
-            elif auth_type == 'basic':
-                if not username or not password:
-                    raise ValueError("Username and password required for basic auth")
-                conn.execute(
-                    """UPDATE channels SET auth_type = 'basic',
-                       username = ?, password_hash = ?, secret_token = NULL
-                       WHERE id = ?""",
-                    (username, hash_password(password), channel_id)
-                )
-                return None
-
-            elif auth_type == 'token':
-                token = generate_token()
-                conn.execute(
-                    """UPDATE channels SET auth_type = 'token',
-                       username = NULL, password_hash = NULL, secret_token = ?
-                       WHERE id = ?""",
-                    (token, channel_id)
-                )
-                return token
+        try:
+            with get_write_db() as conn:
+                if auth_type == 'none':
+                    conn.execute(
+                        """UPDATE channels SET auth_type = 'none',
+                           username = NULL, password_hash = NULL, password_salt = NULL,
+                           secret_token = NULL
+                           WHERE id = ?""",
+                        (channel_id,)
+                    )
+                    return None
+
+                elif auth_type == 'basic':
+                    if not username or not password:
+                        raise ValueError("Username and password required for basic auth")
+                    salt = generate_salt()
+                    conn.execute(
+                        """UPDATE channels SET auth_type = 'basic',
+                           username = ?, password_hash = ?, password_salt = ?, secret_token = NULL
+                           WHERE id = ?""",
+                        (username, hash_password(password, salt), salt, channel_id)
+                    )
+                    return None
+
+                elif auth_type == 'token':
+                    token = generate_token()
+                    conn.execute(
+                        """UPDATE channels SET auth_type = 'token',
+                           username = NULL, password_hash = NULL, password_salt = NULL,
+                           secret_token = ?
+                           WHERE id = ?""",
+                        (token, channel_id)
+                    )
+                    return token
 
-            else:
-                raise ValueError(f"Invalid auth type: {auth_type}")
+                else:
+                    raise ValueError(f"Invalid auth type: {auth_type}")
+        finally:
+            # Drop cached lookups once the change is committed
+            invalidate_channel_cache()
+
+    @staticmethod
+    def set_refresh_status(channel_id: int, status: str):
+        """Record the refresh state of a channel ('idle', 'queued', 'running' or 'error')."""
+        with get_write_db() as conn:
+            conn.execute(
+                "UPDATE channels SET refresh_status = ? WHERE id = ?",
+                (status, channel_id)
+            )
+        invalidate_channel_cache()
+
+    @staticmethod
+    def mark_checked(channel_id: int):
+        """Record that the channel's video list was just fetched from YouTube."""
+        with get_write_db() as conn:
+            conn.execute(
+                "UPDATE channels SET last_checked_at = ? WHERE id = ?",
+                (datetime.now(), channel_id)
+            )
+        invalidate_channel_cache()
 
     @staticmethod
     def verify_basic_auth(channel_id: int, username: str, password: str) -> bool:
         """Verify basic auth credentials for a channel."""
+        # Podcast apps send the same credentials on every poll
+        key = (channel_id, username, hashlib.blake2b((password or '').encode(), digest_size=16).digest())
+        with _channel_cache_lock:
+            if key in _verified_auth:
+                return True
+
         with get_db() as conn:
             row = conn.execute(
-                "SELECT username, password_hash FROM channels WHERE id = ?",
+                "SELECT username, password_hash, password_salt FROM channels WHERE id = ?",
                 (channel_id,)
             ).fetchone()
-            if not row:
-                return False
-            return row['username'] == username and row['password_hash'] == hash_password(password)
+        if not row:
+            return False
+
+        password_hash = hash_password(password or '', row['password_salt'])
+        verified = (
+            hmac.compare_digest((row['username'] or '').encode(), (username or '').encode())
+            and hmac.compare_digest((row['password_hash'] or '').encode(), password_hash.encode())
+        )
+        if verified and row['password_salt'] is None:
+            Channel._upgrade_password_hash(channel_id, row['password_hash'], password or '')
+        if verified:
+            with _channel_cache_lock:
+                _verified_auth[key] = True
+        return verified
+
+    @staticmethod
+    def _upgrade_password_hash(channel_id: int, legacy_hash: str, password: str):
+        """Replace a verified unsalted password hash with a salted one."""
+        salt = generate_salt()
+        with get_write_db() as conn:
+            # Unless the password was changed since it was verified
+            conn.execute(
+                """UPDATE channels SET password_hash = ?, password_salt = ?
+                   WHERE id = ? AND password_salt IS NULL AND password_hash = ?""",
+                (hash_password(password, salt), salt, channel_id, legacy_hash)
+            )
+        invalidate_channel_cache()
+
+
+_INSERT_EPISODE_SQL = """
+    INSERT INTO episodes
+    (channel_id, video_id, title, description, duration, published_at, audio_path, thumbnail_url,
+     file_size, downloaded_at, download_attempts, last_attempt_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
 
 
 class Episode:
@@ -195,31 +421,105 @@ class Episode:
     @staticmethod
     def create(channel_id: int, video_id: str, title: str, description: str = None,
                duration: int = None, published_at: datetime = None,
-               audio_path: str = None, thumbnail_url: str = None) -> int:
-        """Create a new episode and return its ID."""
-        with get_db() as conn:
-            cursor = conn.execute("""
-                INSERT INTO episodes
-                (channel_id, video_id, title, description, duration, published_at, audio_path, thumbnail_url, downloaded_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+               audio_path: str = None, thumbnail_url: str = None, file_size: int = None) -> int:
+        """Create a new episode and return its ID; without audio_path it counts as a failed download."""
+        now = datetime.now()
+        with get_write_db() as conn:
+            cursor = conn.execute(_INSERT_EPISODE_SQL, (
                 channel_id, video_id, title, description, duration,
-                published_at, audio_path, thumbnail_url,
-                datetime.now() if audio_path else None
+                published_at, audio_path, thumbnail_url, file_size,
+                now if audio_path else None,
+                0 if audio_path else 1,
+                None if audio_path else now
             ))
             return cursor.lastrowid
 
     @staticmethod
-    def get_by_channel(channel_id: int) -> list:
-        """Get all episodes for a channel, ordered by publish date."""
+    def create_many(rows: list[dict]):
+        """Create several episodes in a single transaction; rows take the same keys as create()."""
+        if not rows:
+            return
+        now = datetime.now()
+        with get_write_db() as conn:
+            conn.executemany(_INSERT_EPISODE_SQL, [
+                (
+                    row['channel_id'], row['video_id'], row['title'], row.get('description'),
+                    row.get('duration'), row.get('published_at'), row.get('audio_path'),
+                    row.get('thumbnail_url'), row.get('file_size'),
+                    now if row.get('audio_path') else None,
+                    0 if row.get('audio_path') else 1,
+                    None if row.get('audio_path') else now
+                )
+                for row in rows
+            ])
+
+    @staticmethod
+    def get_by_channel(channel_id: int, limit: int | None = FEED_EPISODE_LIMIT, offset: int = 0) -> Iterator[dict]:
+        """Yield a channel's downloaded episodes, newest first (all of them when limit is None)."""
         with get_db() as conn:
-            rows = conn.execute(
+            cursor = conn.execute(
                 """SELECT * FROM episodes
                    WHERE channel_id = ? AND audio_path IS NOT NULL
-                   ORDER BY published_at DESC""",
+                   ORDER BY published_at DESC
+                   LIMIT ? OFFSET ?""",
+                (channel_id, -1 if limit is None else limit, offset)
+            )
+            for row in cursor:
+                yield dict(row)
+
+    @staticmethod
+    def get_recent_video_ids(channel_id: int, limit: int) -> set[str]:
+        """Get the video IDs of a channel's newest downloaded episodes."""
+        with get_db() as conn:
+            rows = conn.execute(
+                """SELECT video_id FROM episodes
+                   WHERE channel_id = ? AND audio_path IS NOT NULL
+                   ORDER BY published_at DESC
+                   LIMIT ?""",
+                (channel_id, limit)
+            ).fetchall()
+            return {row[0] for row in rows}
+
+    @staticmethod
+    def get_undownloaded(channel_id: int) -> list[tuple[int, str, str, bool, int, str | None]]:
+        """
+        Get a channel's episodes without audio, e.g. failed downloads, as
+        (id, video_id, title, has_metadata, download_attempts, last_attempt_at) tuples.
+        """
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            return cursor.execute(
+                """SELECT id, video_id, title, published_at IS NOT NULL,
+                          COALESCE(download_attempts, 0), last_attempt_at
+                   FROM episodes WHERE channel_id = ? AND audio_path IS NULL""",
                 (channel_id,)
             ).fetchall()
-            return [dict(row) for row in rows]
+
+    @staticmethod
+    def get_feed_fingerprint(channel_id: int) -> tuple[int, str | None]:
+        """Get (episode count, latest download time) for a channel's feed."""
+        with get_db() as conn:
+            row = conn.execute(
+                """SELECT COUNT(*), MAX(downloaded_at) FROM episodes
+                   WHERE channel_id = ? AND audio_path IS NOT NULL""",
+                (channel_id,)
+            ).fetchone()
+            return row[0], row[1]
+
+    @staticmethod
+    def get_existing_video_ids(video_ids: list[str]) -> set[str]:
+        """Get which of the given video IDs already have downloaded audio."""
+        if not video_ids:
+            return set()
+        placeholders = ','.join('?' * len(video_ids))
+        with get_db() as conn:
+            rows = conn.execute(
+                f"""SELECT video_id FROM episodes
+                    WHERE audio_path IS NOT NULL AND video_id IN ({placeholders})""",
+                video_ids
+            ).fetchall()
+            return {row[0] for row in rows}
 
     @staticmethod
     def get_by_video_id(video_id: str) -> dict | None:
@@ -232,16 +532,38 @@ class Episode:
             return dict(row) if row else None
 
     @staticmethod
-    def update_audio_path(episode_id: int, audio_path: str):
-        """Update the audio path for an episode."""
-        with get_db() as conn:
+    def update_audio_path(episode_id: int, audio_path: str, file_size: int = None):
+        """Update the audio path and size for an episode."""
+        with get_write_db() as conn:
+            conn.execute(
+                "UPDATE episodes SET audio_path = ?, file_size = ?, downloaded_at = ? WHERE id = ?",
+                (audio_path, file_size, datetime.now(), episode_id)
+            )
+
+    @staticmethod
+    def update_metadata(episode_id: int, title: str, description: str = None, duration: int = None,
+                        published_at: datetime = None, thumbnail_url: str = None):
+        """Update the video metadata of an episode saved without it."""
+        with get_write_db() as conn:
+            conn.execute(
+                """UPDATE episodes SET title = ?, description = ?, duration = ?, published_at = ?,
+                   thumbnail_url = ? WHERE id = ?""",
+                (title, description, duration, published_at, thumbnail_url, episode_id)
+            )
+
+    @staticmethod
+    def record_failed_attempt(episode_id: int):
+        """Count another failed download of an episode."""
+        with get_write_db() as conn:
             conn.execute(
-                "UPDATE episodes SET audio_path = ?, downloaded_at = ? WHERE id = ?",
-                (audio_path, datetime.now(), episode_id)
+                """UPDATE episodes SET download_attempts = COALESCE(download_attempts, 0) + 1,
+                   last_attempt_at = ? WHERE id = ?""",
+                (datetime.now(), episode_id)
             )
 
     @staticmethod
-    def delete_by_channel(channel_id: int):
-        """Delete all episodes for a channel."""
+    def get_all_audio_paths() -> set[str]:
+        """Get the audio file names of all downloaded episodes."""
         with get_db() as conn:
-            conn.execute("DELETE FROM episodes WHERE channel_id = ?", (channel_id,))
+            rows = conn.execute("SELECT audio_path FROM episodes WHERE audio_path IS NOT NULL").fetchall()
+            return {row[0] for row in rows}
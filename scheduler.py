@@ -1,89 +1,378 @@
+import os
+import time
+import random
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from apscheduler.executors.pool import ThreadPoolExecutor as JobThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from config import CHECK_INTERVAL_HOURS
+from config import (CHECK_INTERVAL_HOURS, REFRESH_CONCURRENCY, DOWNLOAD_WORKERS, SCHEDULER_LOCK_PATH,
+                    DESCRIPTION_MAX_LENGTH, AUDIO_DIR_STR, AUDIO_FORMAT, INITIAL_FETCH_COUNT,
+                    MAX_DOWNLOAD_ATTEMPTS)
 from models import Channel, Episode
-from downloader import fetch_channel_videos, get_video_metadata, download_audio
+from downloader import fetch_channel_videos, submit_video_metadata, download_audio
 
 logger = logging.getLogger(__name__)
 
+# Per-channel locks so the same channel is never refreshed twice at once
+_refresh_locks: dict[int, threading.Lock] = {}
+_refresh_locks_guard = threading.Lock()
 
-def refresh_channel(channel: dict):
+# Open file holding the periodic-refresh lock for this process
+_scheduler_lock_file = None
+
+# Scheduled refreshes skip channels checked more recently than this. Half the
+# interval, so a check that ran late does not push the next one a full tick back
+MIN_CHECK_AGE = timedelta(hours=CHECK_INTERVAL_HOURS) / 2
+
+# Job ids: one periodic refresh job per channel, plus one-off refreshes queued from the API
+PERIODIC_JOB_PREFIX = 'periodic-refresh-'
+QUEUED_JOB_PREFIX = 'queued-refresh-'
+REFRESH_JITTER_SECONDS = 1800
+INITIAL_STAGGER_SECONDS = 300
+CHANNEL_SYNC_MINUTES = 10
+
+# Audio files younger than this are never treated as orphaned
+ORPHAN_MIN_AGE = timedelta(days=1)
+_AUDIO_SUFFIX = f'.{AUDIO_FORMAT}'
+
+# Delay before retrying a failed video, doubled after every further failure
+RETRY_BACKOFF = MIN_CHECK_AGE
+
+# New episodes are inserted in batches of this size, one transaction each
+EPISODE_BATCH_SIZE = 10
+
+
+def _checked_recently(channel: dict) -> bool:
+    """Check whether the channel's video list was fetched within MIN_CHECK_AGE."""
+    last_checked_at = channel.get('last_checked_at')
+    if not last_checked_at:
+        return False
+    if isinstance(last_checked_at, str):
+        last_checked_at = datetime.fromisoformat(last_checked_at)
+    return datetime.now() - last_checked_at < MIN_CHECK_AGE
+
+
+def _retry_due(attempts: int, last_attempt_at, force: bool = False) -> bool:
+    """
+    Check whether a video without audio should be tried again. Unless force is
+    set, waits RETRY_BACKOFF, doubled for each earlier failure; never retries
+    after MAX_DOWNLOAD_ATTEMPTS.
+    """
+    if attempts >= MAX_DOWNLOAD_ATTEMPTS:
+        return False
+    if force or not last_attempt_at:
+        return True
+    if isinstance(last_attempt_at, str):
+        last_attempt_at = datetime.fromisoformat(last_attempt_at)
+    return datetime.now() - last_attempt_at >= RETRY_BACKOFF * 2 ** max(attempts - 1, 0)
+
+
+def _refresh_lock(channel_id: int) -> threading.Lock:
+    """Get the refresh lock for a channel."""
+    with _refresh_locks_guard:
+        return _refresh_locks.setdefault(channel_id, threading.Lock())
+
+
+def is_refresh_running(channel_id: int) -> bool:
+    """Check whether a refresh of the channel is in progress."""
+    return _refresh_lock(channel_id).locked()
+
+
+def refresh_channel(channel: dict, force: bool = False) -> bool:
     """
     Check a channel for new videos and download them.
+    Unless force is set, channels checked within MIN_CHECK_AGE are skipped.
+    Returns False if the refresh was skipped.
     """
-    logger.info(f"Refreshing channel: {channel['name']}")
+    if not force and _checked_recently(channel):
+        logger.info("Skipping recently checked channel: %s", channel['name'])
+        return False
+
+    lock = _refresh_lock(channel['id'])
+    if not lock.acquire(blocking=False):
+        logger.info("Refresh already running for channel: %s", channel['name'])
+        return False
 
     try:
-        videos = fetch_channel_videos(channel['youtube_channel_id'])
+        _refresh_channel(channel, force)
+    finally:
+        lock.release()
+    return True
 
-        for video in videos:
-            video_id = video['video_id']
 
-            # Skip if already downloaded
-            existing = Episode.get_by_video_id(video_id)
-            if existing and existing.get('audio_path'):
-                continue
+def _save_episodes(new_episodes: list[dict]):
+    """Insert queued episodes in one transaction and empty the queue."""
+    if not new_episodes:
+        return
+    try:
+        Episode.create_many(new_episodes)
+    except Exception as e:
+        # One bad row rolls back the whole batch; save the others one at a time
+        logger.warning("Batch insert of %d episodes failed, retrying individually: %s", len(new_episodes), e)
+        for episode in new_episodes:
+            try:
+                Episode.create(**episode)
+            except Exception as e:
+                logger.error("Failed to save episode %s: %s", episode['video_id'], e)
+    new_episodes.clear()
 
-            logger.info(f"Processing new video: {video['title']}")
 
-            try:
-                # Get full metadata
-                metadata = get_video_metadata(video_id)
+def _episode_metadata(metadata: dict) -> dict:
+    """Get the episode columns taken from a video's metadata."""
+    return {
+        'title': metadata['title'],
+        'description': (metadata.get('description') or '')[:DESCRIPTION_MAX_LENGTH] or None,
+        'duration': metadata.get('duration'),
+        'published_at': metadata.get('published_at'),
+        'thumbnail_url': metadata.get('thumbnail_url'),
+    }
+
+
+def _new_episode(channel_id: int, video_id: str, metadata: dict,
+                 audio_path: str = None, file_size: int = None) -> dict:
+    """Build the episode row for a video; without audio_path it is retried on later refreshes."""
+    return {
+        'channel_id': channel_id,
+        'video_id': video_id,
+        **_episode_metadata(metadata),
+        'audio_path': audio_path,
+        'file_size': file_size,
+    }
+
+
+def _failed_episode(channel_id: int, video: dict) -> dict:
+    """Build the episode row for a video whose metadata lookup failed, from its listing entry."""
+    return _new_episode(channel_id, video['video_id'], {'title': video.get('title') or 'Untitled'})
+
+
+def _refresh_channel(channel: dict, force: bool = False):
+    """
+    Download new videos of a channel; callers hold the channel's refresh lock.
+    Forced refreshes always list the channel on YouTube, bypassing the cached
+    listing, and retry failed videos without waiting for their backoff.
+    """
+    logger.info("Refreshing channel: %s", channel['name'])
+    Channel.set_refresh_status(channel['id'], 'running')
+
+    try:
+        # Only list videos newer than the latest ones already downloaded
+        known_ids = Episode.get_recent_video_ids(channel['id'], INITIAL_FETCH_COUNT)
+        videos, fresh = fetch_channel_videos(channel['youtube_channel_id'], known_ids=known_ids, force=force)
+        # A cached listing is not a check; recording one would delay the next real one
+        if fresh:
+            Channel.mark_checked(channel['id'])
+
+        # Episodes without audio are earlier failures; retry them, with backoff, since
+        # older ones are no longer in the listing. Their entry in pending carries
+        # (episode_id, has_metadata); new videos carry None
+        undownloaded = {row[1]: row for row in Episode.get_undownloaded(channel['id'])}
+
+        # Skip videos that are already downloaded, with a single query
+        downloaded = Episode.get_existing_video_ids([video['video_id'] for video in videos])
+        pending = [
+            (video, None) for video in videos
+            if video['video_id'] not in downloaded and video['video_id'] not in undownloaded
+        ]
+        pending.extend(
+            ({'video_id': video_id, 'title': title}, (episode_id, has_metadata))
+            for episode_id, video_id, title, has_metadata, attempts, last_attempt_at in undownloaded.values()
+            if _retry_due(attempts, last_attempt_at, force)
+        )
 
-                # Download audio
-                audio_filename, _ = download_audio(video_id)
+        # Fetch metadata in the background, for new videos and episodes saved without it
+        pending_by_id = {video['video_id']: (video, existing) for video, existing in pending}
+        metadata_futures = submit_video_metadata(
+            [video['video_id'] for video, existing in pending if not existing or not existing[1]]
+        )
 
-                # Create or update episode
+        new_episodes = []
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            # Episodes with metadata only need their audio
+            futures = {}
+            for video, existing in pending:
+                if existing and existing[1]:
+                    logger.info("Processing new video: %s", video['title'])
+                    futures[pool.submit(download_audio, video['video_id'])] = (video, existing, None)
+
+            # Start each download as soon as its metadata arrives, so downloads
+            # and ffmpeg overlap with the remaining metadata requests
+            for metadata_future in as_completed(metadata_futures):
+                video, existing = pending_by_id[metadata_futures[metadata_future]]
+                try:
+                    metadata = metadata_future.result()
+                except Exception as e:
+                    logger.error("Failed to get metadata for video %s: %s", video['video_id'], e)
+                    # Record the video without audio, so later refreshes retry it
+                    if existing:
+                        Episode.record_failed_attempt(existing[0])
+                    else:
+                        new_episodes.append(_failed_episode(channel['id'], video))
+                    continue
+                if existing:
+                    Episode.update_metadata(existing[0], **_episode_metadata(metadata))
+                logger.info("Processing new video: %s", video['title'])
+                futures[pool.submit(download_audio, video['video_id'])] = (video, existing, metadata)
+
+            for future in as_completed(futures):
+                video, existing, metadata = futures[future]
+                video_id = video['video_id']
+
+                try:
+                    audio_filename, file_size = future.result()
+                except Exception as e:
+                    logger.error("Failed to process video %s: %s", video_id, e)
+                    # Keep the episode without audio, so later refreshes retry the download
+                    if existing:
+                        Episode.record_failed_attempt(existing[0])
+                    else:
+                        new_episodes.append(_new_episode(channel['id'], video_id, metadata))
+                    continue
+
+                # Update the existing episode, or queue a new one for the next batch insert
                 if existing:
-                    Episode.update_audio_path(existing['id'], audio_filename)
+                    episode_id, _ = existing
+                    Episode.update_audio_path(episode_id, audio_filename, file_size)
                 else:
-                    Episode.create(
-                        channel_id=channel['id'],
-                        video_id=video_id,
-                        title=metadata['title'],
-                        description=metadata.get('description'),
-                        duration=metadata.get('duration'),
-                        published_at=metadata.get('published_at'),
-                        audio_path=audio_filename,
-                        thumbnail_url=metadata.get('thumbnail_url')
-                    )
-
-                logger.info(f"Downloaded: {metadata['title']}")
+                    new_episodes.append(_new_episode(channel['id'], video_id, metadata, audio_filename, file_size))
+                    if len(new_episodes) >= EPISODE_BATCH_SIZE:
+                        _save_episodes(new_episodes)
 
-            except Exception as e:
-                logger.error(f"Failed to process video {video_id}: {e}")
-                continue
+                logger.info("Downloaded: %s", video['title'])
+
+            _save_episodes(new_episodes)
+
+        Channel.set_refresh_status(channel['id'], 'idle')
 
     except Exception as e:
-        logger.error(f"Failed to refresh channel {channel['name']}: {e}")
+        logger.error("Failed to refresh channel %s: %s", channel['name'], e)
+        Channel.set_refresh_status(channel['id'], 'error')
 
 
-def refresh_all_channels():
+def acquire_scheduler_lock() -> bool:
     """
-    Refresh all channels - called by scheduler.
+    Try to become the process that runs the periodic refresh.
+    The lock is held until the process exits. Always succeeds where
+    file locking is unavailable (Windows).
     """
-    logger.info("Starting scheduled refresh of all channels")
-    channels = Channel.get_all()
+    global _scheduler_lock_file
+    try:
+        import fcntl
+    except ImportError:
+        return True
 
-    for channel in channels:
-        refresh_channel(channel)
+    lock_file = open(SCHEDULER_LOCK_PATH, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
 
-    logger.info("Finished scheduled refresh")
+    _scheduler_lock_file = lock_file
+    return True
 
 
-def create_scheduler() -> BackgroundScheduler:
+def refresh_scheduled_channel(channel_id: int) -> bool:
+    """Run the periodic refresh of one channel, skipping channels deleted since scheduling."""
+    channel = Channel.get_by_id(channel_id)
+    if not channel:
+        return False
+    return refresh_channel(channel)
+
+
+def _staggered_start() -> datetime:
+    """Get a random first run time within INITIAL_STAGGER_SECONDS from now."""
+    return datetime.now() + timedelta(seconds=random.randint(0, INITIAL_STAGGER_SECONDS))
+
+
+def sync_channel_jobs(scheduler: BackgroundScheduler):
+    """Add a periodic refresh job for each new channel and drop jobs of deleted channels."""
+    job_ids = {f"{PERIODIC_JOB_PREFIX}{channel['id']}": channel['id'] for channel in Channel.get_all_for_refresh()}
+
+    for job in scheduler.get_jobs():
+        if job.id.startswith(PERIODIC_JOB_PREFIX) and job.id not in job_ids:
+            scheduler.remove_job(job.id)
+
+    for job_id, channel_id in job_ids.items():
+        if scheduler.get_job(job_id):
+            continue
+        # Stagger first runs and jitter every run, so channels never hit YouTube all at once
+        scheduler.add_job(
+            func=refresh_scheduled_channel,
+            args=[channel_id],
+            trigger=IntervalTrigger(hours=CHECK_INTERVAL_HOURS, jitter=REFRESH_JITTER_SECONDS),
+            id=job_id,
+            name=f'Refresh channel {channel_id}',
+            next_run_time=_staggered_start()
+        )
+
+
+def remove_orphaned_audio() -> int:
     """
-    Create and configure the background scheduler.
+    Delete audio files that no episode refers to, e.g. downloads whose
+    channel was deleted mid-refresh. Returns the number of files removed.
     """
-    scheduler = BackgroundScheduler()
+    # Audio files exist shortly before their episode rows are saved, so leave recent ones
+    cutoff = time.time() - ORPHAN_MIN_AGE.total_seconds()
+    known = Episode.get_all_audio_paths()
+    removed = 0
 
+    with os.scandir(AUDIO_DIR_STR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(_AUDIO_SUFFIX) or entry.name in known or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime > cutoff:
+                    continue
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+
+    if removed:
+        logger.info("Removed %d orphaned audio files", removed)
+    return removed
+
+
+def schedule_channel_refreshes(scheduler: BackgroundScheduler):
+    """
+    Register the periodic per-channel refresh jobs and audio cleanup. Channels
+    added or deleted through any worker are picked up by a sync job.
+    """
+    sync_channel_jobs(scheduler)
     scheduler.add_job(
-        func=refresh_all_channels,
-        trigger=IntervalTrigger(hours=CHECK_INTERVAL_HOURS),
-        id='refresh_channels',
-        name='Refresh all YouTube channels',
+        func=sync_channel_jobs,
+        args=[scheduler],
+        trigger=IntervalTrigger(minutes=CHANNEL_SYNC_MINUTES),
+        id='sync_channel_jobs',
+        name='Sync channel refresh jobs',
         replace_existing=True
     )
+    scheduler.add_job(
+        func=remove_orphaned_audio,
+        trigger=IntervalTrigger(hours=24),
+        id='remove_orphaned_audio',
+        name='Remove orphaned audio files',
+        # Interval triggers first fire a full interval after start; with daily
+        # restarts the cleanup would never run
+        next_run_time=_staggered_start(),
+        replace_existing=True
+    )
+
 
-    return scheduler
+def create_scheduler() -> BackgroundScheduler:
+    """
+    Create and configure the background scheduler. Every refresh, scheduled
+    or queued from the API, runs on its pool of REFRESH_CONCURRENCY threads.
+    """
+    return BackgroundScheduler(
+        executors={'default': JobThreadPoolExecutor(max_workers=REFRESH_CONCURRENCY)},
+        job_defaults={
+            'max_instances': 1,
+            'coalesce': True,
+            # Run late rather than skip when all pool threads are busy
+            'misfire_grace_time': None,
+        }
+    )